@@ -1,9 +1,126 @@
-import xml.etree.ElementTree as ET
 from math import radians, cos, sin, asin, sqrt
-from datetime import datetime
+from array import array
 import numpy as np
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import os
+import warnings
+from xml.sax.saxutils import quoteattr
+
+try:
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:
+    # 未安装lxml时使用标准库，接口相同只是更慢
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    # 未安装numba时退化为普通Python函数，结果相同只是更慢
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# datetime64 数组中 NaT 对应的 int64 值
+NAT_INT = np.iinfo(np.int64).min
+
+
+@njit(cache=True, fastmath=True)
+def _haversine(lat1, lon1, lat2, lon2):
+    """计算两点间的距离（米），与 GPXSimplifier.haversine_distance 相同"""
+    lat1, lon1, lat2, lon2 = radians(lat1), radians(lon1), radians(lat2), radians(lon2)
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    return 2 * asin(sqrt(a)) * 6371000
+
+
+@njit(cache=True, fastmath=True)
+def _scan_stays(lats, lons, ts, steps, stay_radius, min_stay_time):
+    """
+    扫描停留区域和移动段。
+
+    Args:
+        lats, lons: 经纬度数组
+        ts: 时间戳数组（纳秒，int64，NAT_INT 表示无时间）
+        steps: 相邻两点间的距离（米），steps[i] 为第i点到第i+1点的距离
+
+    Returns:
+        (stays, moves): 两个 (k, 2) 的 int64 数组，每行是 [start, end) 索引
+    """
+    n = len(lats)
+    stays = np.empty((n, 2), dtype=np.int64)
+    moves = np.empty((n, 2), dtype=np.int64)
+    n_stays = 0
+    n_moves = 0
+
+    i = 0
+    while i < n:
+        # 候选停留区域为 [i, j)，增量维护其经纬度之和
+        j = i + 1
+        sum_lat = lats[i]
+        sum_lon = lons[i]
+        while j < n:
+            count = j - i
+            center_lat = sum_lat / count
+            center_lon = sum_lon / count
+
+            if _haversine(lats[j], lons[j], center_lat, center_lon) <= stay_radius:
+                sum_lat += lats[j]
+                sum_lon += lons[j]
+                j += 1
+                continue
+
+            # 检查是否是短暂移动后又回到停留区域（最多检查10个点）
+            stop = min(j + 10, n)
+            k = j + 1
+            while k < stop and _haversine(lats[k], lons[k], center_lat, center_lon) > stay_radius:
+                k += 1
+            if k >= stop:
+                # 没有回到停留区域
+                break
+            # 回到了停留区域，将临时移动的点也加入
+            while j <= k:
+                sum_lat += lats[j]
+                sum_lon += lons[j]
+                j += 1
+
+        # 判断是否为有效的停留区域
+        if j - i < 2:
+            is_stay = False
+        elif ts[i] != NAT_INT and ts[j - 1] != NAT_INT:
+            is_stay = (ts[j - 1] - ts[i]) / 1e9 >= min_stay_time
+        else:
+            is_stay = j - i >= 10
+
+        if is_stay:
+            stays[n_stays, 0] = i
+            stays[n_stays, 1] = j
+            n_stays += 1
+            i = j
+        else:
+            # 不是停留区域，找到下一个移动段的终点
+            moving_start = i
+            while i < n - 1:
+                # 如果距离很小，可能是开始停留了
+                if steps[i] < 10:
+                    break
+                i += 1
+            if i > moving_start:
+                moves[n_moves, 0] = moving_start
+                moves[n_moves, 1] = i + 1
+                n_moves += 1
+            i += 1
+
+    return stays[:n_stays], moves[:n_moves]
+
 
 class GPXSimplifier:
     def __init__(self, stay_radius=100, min_stay_time=600, max_stay_points=2, moving_threshold=200):
@@ -50,375 +167,401 @@ class GPXSimplifier:
         # 地球半径（米）
         r = 6371000
         return c * r
+
+    def _hav_term(self, idx_slice, lat0, lon0):
+        """
+        haversine公式中的 a 项，与距离单调对应。
+        只需比较远近（如找最近点）时直接使用，省去 sqrt 和 arcsin。
+        """
+        lat0r, lon0r = radians(lat0), radians(lon0)
+        a = self.lat_rad[idx_slice] - lat0r
+        a *= 0.5
+        np.sin(a, out=a)
+        a *= a
+        b = self.lon_rad[idx_slice] - lon0r
+        b *= 0.5
+        np.sin(b, out=b)
+        b *= b
+        b *= self.coslat[idx_slice]
+        b *= cos(lat0r)
+        a += b
+        return a
+
+    def _close_enough(self, i, j, r):
+        """判断第 i、j 个点的距离是否小于 r（米）
+
+        先用等距矩形近似比较距离平方，只有结果落在阈值 ±5% 以内时才用 haversine 精确计算
+        """
+        dy = self.lat_rad[j] - self.lat_rad[i]
+        dx = (self.lon_rad[j] - self.lon_rad[i]) * self.coslat[i]
+        ratio = (dy * dy + dx * dx) / (r / 6371000) ** 2
+        if ratio < 0.95 ** 2:
+            return True
+        if ratio > 1.05 ** 2:
+            return False
+        return self.haversine_distance(self.lats[i], self.lons[i],
+                                       self.lats[j], self.lons[j]) < r
+
+    def _step_distances(self):
+        """一次性计算相邻两点间的距离（米），steps[i] 为第i点到第i+1点的距离"""
+        a = (np.sin(np.diff(self.lat_rad)/2)**2 +
+             self.coslat[:-1] * self.coslat[1:] * np.sin(np.diff(self.lon_rad)/2)**2)
+        return 2 * 6371000 * np.arcsin(np.sqrt(a))
+
+    def _take(self, idx):
+        """只保留下标为 idx 的点，同步更新所有数组"""
+        self.lats = self.lats[idx]
+        self.lons = self.lons[idx]
+        self.times = self.times[idx]
+        self.times_i64 = self.times.view(np.int64)
+        self.lat_rad = self.lat_rad[idx]
+        self.lon_rad = self.lon_rad[idx]
+        self.coslat = self.coslat[idx]
+        self.sinlat = self.sinlat[idx]
+        self.bearings = None
+
+    def _precompute_trig(self):
+        """每个文件只做一次角度转换和cos(lat)计算，避免在距离计算中重复求值"""
+        self.lat_rad = np.radians(self.lats)
+        self.lon_rad = np.radians(self.lons)
+        self.coslat = np.cos(self.lat_rad)
+        self.sinlat = np.sin(self.lat_rad)
+        self.bearings = None
+
+    def _precompute_bearings(self, w):
+        """一次性计算所有 bearings[i] = 第i个点到第i+w个点的方位角（度），同一点为0"""
+        self.bearings_window = w
+        if len(self.lats) <= w:
+            self.bearings = np.empty(0)
+            return
+        dlon = self.lon_rad[w:] - self.lon_rad[:-w]
+        y = np.sin(dlon) * self.coslat[w:]
+        x = self.coslat[:-w] * self.sinlat[w:] - self.sinlat[:-w] * self.coslat[w:] * np.cos(dlon)
+        same = (self.lats[w:] == self.lats[:-w]) & (self.lons[w:] == self.lons[:-w])
+        self.bearings = np.where(same, 0.0, np.degrees(np.arctan2(y, x)))
     
     def parse_gpx(self, file_path):
-        """解析GPX文件"""
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        print(f"GPX根元素: {root.tag}")
-        print(f"GPX命名空间: {root.nsmap if hasattr(root, 'nsmap') else '无'}")
+        """
+        流式解析GPX文件（iterparse），只遍历一次，每个轨迹点解析后立即释放。
+        经纬度和时间保存在 self.lats/self.lons/self.times 中。
+        返回GPX的命名空间字典。
+        """
+        context = ET.iterparse(file_path, events=('start', 'end'))
         
-        # 获取所有可能的命名空间
+        root = None
         namespaces = {}
-        if root.tag.startswith('{'):
-            # 提取默认命名空间
-            ns_end = root.tag.find('}')
-            default_ns = root.tag[1:ns_end]
-            namespaces['gpx'] = default_ns
-        
-        points = []
-        
-        # 尝试多种方式查找轨迹点
-        trkpts = []
-        
-        # 方法1: 使用命名空间
-        if namespaces:
-            trkpts = root.findall('.//gpx:trkpt', namespaces)
-            print(f"使用命名空间找到 {len(trkpts)} 个轨迹点")
-        
-        # 方法2: 不使用命名空间
-        if not trkpts:
-            trkpts = root.findall('.//trkpt')
-            print(f"不使用命名空间找到 {len(trkpts)} 个轨迹点")
-        
-        # 方法3: 查找所有包含lat和lon属性的元素
-        if not trkpts:
-            for elem in root.iter():
-                if elem.get('lat') and elem.get('lon'):
-                    trkpts.append(elem)
-            print(f"通过属性匹配找到 {len(trkpts)} 个轨迹点")
-        
-        # 方法4: 调试 - 打印GPX结构
-        if not trkpts:
-            print("未找到轨迹点，打印GPX结构前10个元素:")
-            count = 0
-            for elem in root.iter():
-                print(f"  {elem.tag}: {elem.attrib}")
-                count += 1
-                if count >= 10:
-                    break
-        
-        for trkpt in trkpts:
+        # (纬度, 经度, 时间字符串)，经纬度直接写入连续的double缓冲区
+        points = (array('d'), array('d'), [])
+        # 没有trkpt时，退而使用所有包含lat和lon属性的元素
+        fallback_points = (array('d'), array('d'), [])
+        debug_elems = []
+        
+        for event, elem in context:
+            if root is None:
+                # 第一个start事件即为根元素
+                root = elem
+                print(f"GPX根元素: {root.tag}")
+                print(f"GPX命名空间: {root.nsmap if hasattr(root, 'nsmap') else '无'}")
+                
+                ns_prefix = ''
+                if root.tag.startswith('{'):
+                    # 提取默认命名空间
+                    ns_end = root.tag.find('}')
+                    default_ns = root.tag[1:ns_end]
+                    namespaces['gpx'] = default_ns
+                    ns_prefix = f'{{{default_ns}}}'
+                # 命名空间只确定一次，之后直接比较完整的标签名（也兼容不带命名空间的trkpt）
+                trkpt_tags = {ns_prefix + 'trkpt', 'trkpt'}
+                time_tag = ns_prefix + 'time'
+                continue
+            
+            if event == 'start':
+                if len(debug_elems) < 10:
+                    debug_elems.append(elem)
+                continue
+            
+            if elem.tag in trkpt_tags:
+                target = points
+            elif elem.get('lat') and elem.get('lon') and not points[0]:
+                target = fallback_points
+            else:
+                continue
+            
             try:
-                lat = float(trkpt.get('lat'))
-                lon = float(trkpt.get('lon'))
+                lat = float(elem.get('lat'))
+                lon = float(elem.get('lon'))
                 
-                # 获取时间
-                time_elem = None
-                timestamp = None
+                # 获取时间，先只收集字符串，解析完成后再批量转换
+                time_str = 'NaT'
                 
                 # 尝试不同的时间元素查找方式
-                if namespaces:
-                    time_elem = trkpt.find('gpx:time', namespaces)
-                if time_elem is None:
-                    time_elem = trkpt.find('time')
+                time_elem = elem.find(time_tag)
+                if time_elem is None and namespaces:
+                    time_elem = elem.find('time')
                 
                 if time_elem is not None and time_elem.text:
                     time_str = time_elem.text.strip()
-                    # 解析时间（处理不同格式）
-                    try:
-                        if 'T' in time_str:
-                            if time_str.endswith('Z'):
-                                timestamp = datetime.fromisoformat(time_str[:-1].replace('Z', ''))
-                            elif '+' in time_str or time_str.count(':') > 2:
-                                # 处理带时区的时间
-                                timestamp = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
-                            else:
-                                timestamp = datetime.fromisoformat(time_str)
-                        else:
-                            timestamp = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
-                    except Exception as e:
-                        print(f"时间解析失败: {time_str}, 错误: {e}")
-                        timestamp = None
+                    if time_str.endswith('Z'):
+                        time_str = time_str[:-1]
                 
-                points.append({
-                    'lat': lat,
-                    'lon': lon,
-                    'time': timestamp,
-                    'element': trkpt
-                })
+                target[0].append(lat)
+                target[1].append(lon)
+                target[2].append(time_str)
             except (ValueError, TypeError) as e:
                 print(f"解析轨迹点失败: {e}")
-                continue
+            
+            # 释放已解析的轨迹点
+            elem.clear()
+            if HAS_LXML:
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        
+        print(f"找到 {len(points[0])} 个轨迹点")
+        if not points[0] and fallback_points[0]:
+            points = fallback_points
+            print(f"通过属性匹配找到 {len(points[0])} 个轨迹点")
+        lats, lons, time_strs = points
+        
+        # 调试 - 打印GPX结构
+        if not lats:
+            print("未找到轨迹点，打印GPX结构前10个元素:")
+            for elem in [root] + debug_elems[:9]:
+                print(f"  {elem.tag}: {elem.attrib}")
+        
+        print(f"成功解析 {len(lats)} 个轨迹点")
         
-        print(f"成功解析 {len(points)} 个轨迹点")
-        return points, tree, root, namespaces
+        self.lats = np.frombuffer(lats, dtype=np.float64)
+        self.lons = np.frombuffer(lons, dtype=np.float64)
+        self.times = self._parse_times(time_strs)
+        # 时间的int64视图（纳秒，NaT 为最小值），排序时无时间的点排在最前，与 datetime.min 的约定一致
+        self.times_i64 = self.times.view(np.int64)
+        self._precompute_trig()
+        return namespaces
     
-    def identify_stay_areas_improved(self, points):
-        """改进的停留区域识别算法"""
-        if not points:
-            return [], []
-        
-        # 使用滑动窗口和聚类方法识别停留区域
-        stay_areas = []
-        moving_segments = []
-        
-        i = 0
-        while i < len(points):
-            current_point = points[i]
-            potential_stay_area = [current_point]
-            
-            # 向前查找可能属于同一停留区域的点
-            j = i + 1
-            while j < len(points):
-                next_point = points[j]
-                
-                # 计算与停留区域中心的距离
-                center_lat = sum(p['lat'] for p in potential_stay_area) / len(potential_stay_area)
-                center_lon = sum(p['lon'] for p in potential_stay_area) / len(potential_stay_area)
-                
-                distance = self.haversine_distance(
-                    next_point['lat'], next_point['lon'], center_lat, center_lon
-                )
-                
-                if distance <= self.stay_radius:
-                    potential_stay_area.append(next_point)
-                    j += 1
-                else:
-                    # 检查是否是短暂移动后又回到停留区域
-                    temp_moving = []
-                    k = j
-                    while k < len(points) and len(temp_moving) < 10:  # 最多检查10个点
-                        temp_point = points[k]
-                        temp_distance = self.haversine_distance(
-                            temp_point['lat'], temp_point['lon'], center_lat, center_lon
-                        )
-                        
-                        if temp_distance <= self.stay_radius:
-                            # 回到了停留区域，将临时移动的点也加入
-                            potential_stay_area.extend(temp_moving)
-                            potential_stay_area.append(temp_point)
-                            j = k + 1
-                            break
-                        else:
-                            temp_moving.append(temp_point)
-                            k += 1
-                    else:
-                        # 没有回到停留区域
-                        break
+    def _parse_times(self, time_strs):
+        """批量将时间字符串转换为 datetime64[ns] 数组（带时区的统一转为UTC），无法解析的记为 NaT"""
+        with warnings.catch_warnings():
+            # 带时区偏移的时间会被转换为UTC，忽略numpy的提示
+            warnings.simplefilter('ignore', UserWarning)
+            try:
+                return np.array(time_strs, dtype='datetime64[ns]')
+            except ValueError:
+                pass
             
-            # 判断是否为有效的停留区域
-            if self.is_stay_area(potential_stay_area):
-                stay_areas.append(potential_stay_area)
-                i = j
-            else:
-                # 不是停留区域，找到下一个移动段的终点
-                moving_start = i
-                while i < len(points) - 1:
-                    current = points[i]
-                    next_pt = points[i + 1]
-                    distance = self.haversine_distance(
-                        current['lat'], current['lon'], next_pt['lat'], next_pt['lon']
-                    )
-                    
-                    # 如果距离很小，可能是开始停留了
-                    if distance < 10:  # 10米以内认为开始可能停留
-                        break
-                    i += 1
-                
-                if i > moving_start:
-                    moving_segments.append(points[moving_start:i+1])
-                i += 1
+            # 有格式异常的时间时逐个解析
+            times = np.empty(len(time_strs), dtype='datetime64[ns]')
+            for i, time_str in enumerate(time_strs):
+                try:
+                    times[i] = np.datetime64(time_str, 'ns')
+                except ValueError as e:
+                    print(f"时间解析失败: {time_str}, 错误: {e}")
+                    times[i] = np.datetime64('NaT')
+            return times
+    
+    def identify_stay_areas_improved(self):
+        """
+        改进的停留区域识别算法，在 self.lats/self.lons/self.times 上识别停留区域和移动段
         
-        return stay_areas, moving_segments
+        Returns:
+            (stay_ranges, moving_ranges): 每行是一个 [start, end) 下标范围
+        """
+        # 使用滑动窗口和聚类方法识别停留区域，核心循环见 _scan_stays
+        arrays = (self.lats, self.lons, self.times_i64, self._step_distances())
+        if not HAS_NUMBA:
+            # 纯Python执行时，列表的下标访问比numpy标量快得多
+            arrays = tuple(a.tolist() for a in arrays)
+        return _scan_stays(*arrays, self.stay_radius, self.min_stay_time)
     
     def simplify_gpx_improved(self, input_file, output_file):
         """改进的GPX简化方法"""
-        points, tree, root, ns = self.parse_gpx(input_file)
-        print(f"原始点数: {len(points)}")
+        ns = self.parse_gpx(input_file)
+        n_points = len(self.lats)
+        print(f"原始点数: {n_points}")
         
-        if len(points) == 0:
+        if n_points == 0:
             print("错误: 没有找到任何轨迹点，请检查GPX文件格式")
             return
         
         # ---- 新增的BUPT区域预处理逻辑 ----
         print("开始BUPT区域预处理...")
-        processed_points = []
-        bupt_cluster = []
-        
-        for point in points:
-            if self.is_in_bupt_area(point['lat'], point['lon']):
-                bupt_cluster.append(point)
-            else:
-                if bupt_cluster:
-                    # 如果前面有BUPT区域的点，先简化它们再添加到processed_points
-                    simplified_bupt = self._simplify_bupt_cluster(bupt_cluster)
-                    processed_points.extend(simplified_bupt)
-                    bupt_cluster = [] # 重置BUPT集群
-                processed_points.append(point)
-        
-        # 处理可能在文件末尾的BUPT集群
-        if bupt_cluster:
-            simplified_bupt = self._simplify_bupt_cluster(bupt_cluster)
-            processed_points.extend(simplified_bupt)
-        
-        print(f"BUPT区域预处理后点数: {len(processed_points)}")
-        points = processed_points
+        # 一次向量化比较得到所有点是否在BUPT区域内，再由差分得到连续BUPT片段的 [start, end)
+        in_bupt = ((self.lats >= self.bupt_area['min_lat']) & (self.lats <= self.bupt_area['max_lat']) &
+                   (self.lons >= self.bupt_area['min_lon']) & (self.lons <= self.bupt_area['max_lon']))
+        bounds = np.flatnonzero(np.diff(np.r_[0, in_bupt.view(np.int8), 0])).reshape(-1, 2)
+        
+        keep = []
+        prev_end = 0
+        for start, end in bounds:
+            # BUPT片段之前的点原样保留，BUPT片段简化后再添加
+            keep.append(np.arange(prev_end, start))
+            keep.append(self._simplify_bupt_cluster(start, end))
+            prev_end = end
+        keep.append(np.arange(prev_end, n_points))
+        keep = np.concatenate(keep)
+        
+        print(f"BUPT区域预处理后点数: {len(keep)}")
+        self._take(keep)
+        n_points = len(keep)
         # ---- BUPT区域预处理逻辑结束 ----
 
         # 使用改进的识别算法
-        stay_areas, moving_segments = self.identify_stay_areas_improved(points)
-        print(f"识别到 {len(stay_areas)} 个停留区域")
-        print(f"识别到 {len(moving_segments)} 个移动段")
+        stay_ranges, moving_ranges = self.identify_stay_areas_improved()
+        print(f"识别到 {len(stay_ranges)} 个停留区域")
+        print(f"识别到 {len(moving_ranges)} 个移动段")
         
-        simplified_points = []
+        # 保留点的下标，最多不超过总点数
+        simplified_idx = np.empty(n_points, dtype=np.int64)
+        n_simplified = 0
         
-        # 标记所有停留区域的点
-        stay_points_set = set()
-        for area in stay_areas:
-            for point in area:
-                stay_points_set.add(id(point))
+        # 标记每个点所属的停留区域编号，-1 表示不在停留区域
+        area_id = np.full(n_points, -1, dtype=np.int32)
+        for k, (start, end) in enumerate(stay_ranges):
+            area_id[start:end] = k
         
         # 处理每个点
-        # 注意：这里需要确保被_source_area标记的点不会被重复处理
-        processed_areas = set() 
-        for point in points:
-            if id(point) in stay_points_set:
-                # 这个点属于停留区域，检查是否已经处理过这个区域
-                for area in stay_areas:
-                    # 使用id(area[0])作为区域的唯一标识
-                    if point in area and id(area[0]) not in processed_areas: 
-                        # 简化这个停留区域（只处理一次）
-                        simplified_area = self.simplify_stay_area(area)
-                        simplified_points.extend(simplified_area)
-                        processed_areas.add(id(area[0])) # 标记为已处理
-                        print(f"停留区域: {len(area)} 点简化为 {len(simplified_area)} 点")
-                        break
+        for i in range(n_points):
+            k = area_id[i]
+            if k >= 0:
+                # 这个点属于停留区域，在区域的第一个点处简化整个区域（只处理一次）
+                start, end = stay_ranges[k]
+                if i == start:
+                    simplified_area = self.simplify_stay_area(start, end)
+                    simplified_idx[n_simplified:n_simplified + len(simplified_area)] = simplified_area
+                    n_simplified += len(simplified_area)
+                    print(f"停留区域: {end - start} 点简化为 {len(simplified_area)} 点")
             else:
                 # 不在停留区域的点，检查是否需要保留
-                if self.should_keep_moving_point(point, points, simplified_points):
-                    simplified_points.append(point)
+                last_idx = simplified_idx[n_simplified - 1] if n_simplified else None
+                if self.should_keep_moving_point(i, last_idx):
+                    simplified_idx[n_simplified] = i
+                    n_simplified += 1
+        simplified_idx = simplified_idx[:n_simplified]
         
-        # 按时间排序（如果有时间信息）
-        if simplified_points and simplified_points[0]['time']:
-            simplified_points.sort(key=lambda p: p['time'] or datetime.min)
+        # 按时间排序（如果有时间信息，无时间的点视为最早）
+        if n_simplified and not np.isnat(self.times[simplified_idx[0]]):
+            order = np.argsort(self.times_i64[simplified_idx], kind='stable')
+            simplified_idx = simplified_idx[order]
         
-        print(f"简化后点数: {len(simplified_points)}")
+        print(f"简化后点数: {n_simplified}")
         
         # 创建新的GPX文件
-        self.create_simplified_gpx(simplified_points, tree, root, ns, output_file)
+        self.create_simplified_gpx(simplified_idx, ns, output_file)
 
-    def _simplify_bupt_cluster(self, bupt_cluster):
+    def _simplify_bupt_cluster(self, start, end):
         """
         对BUPT区域内的点进行大幅度缩减。
         根据 self.bupt_simplified_points_count 决定保留点数。
+        
+        Args:
+            start, end: BUPT片段在 self.lats/self.lons/self.times 中的 [start, end) 范围
+        
+        Returns:
+            保留点的下标数组（按时间排序）
         """
-        if not bupt_cluster:
-            return []
+        count = end - start
+        if count <= 0:
+            return np.empty(0, dtype=np.int64)
+        
+        if count <= self.bupt_simplified_points_count:
+            return np.arange(start, end)
         
-        if len(bupt_cluster) <= self.bupt_simplified_points_count:
-            return bupt_cluster
+        times = self.times[start:end]
         
         simplified = []
+        seen_idx = set()  # 已选中点的下标
         if self.bupt_simplified_points_count >= 1:
-            simplified.append(bupt_cluster[0]) # 保留第一个点
+            simplified.append(start) # 保留第一个点
+            seen_idx.add(start)
         
         if self.bupt_simplified_points_count >= 2:
             # 如果有时间，保留最早和最晚
-            if bupt_cluster[0]['time'] and bupt_cluster[-1]['time']:
-                sorted_cluster = sorted(bupt_cluster, key=lambda p: p['time'])
-                if sorted_cluster[0] not in simplified:
-                    simplified.append(sorted_cluster[0])
-                if sorted_cluster[-1] not in simplified:
-                    simplified.append(sorted_cluster[-1])
+            if not np.isnat(times[0]) and not np.isnat(times[-1]):
+                earliest = start + int(np.argmin(times))
+                latest = end - 1 - int(np.argmax(times[::-1]))  # 时间相同时取最后一个
+                for idx in (earliest, latest):
+                    if idx not in seen_idx:
+                        simplified.append(idx)
+                        seen_idx.add(idx)
             else: # 如果没有时间，保留第一个和最后一个
-                if bupt_cluster[-1] not in simplified:
-                    simplified.append(bupt_cluster[-1])
+                if end - 1 not in seen_idx:
+                    simplified.append(end - 1)
+                    seen_idx.add(end - 1)
         
         if self.bupt_simplified_points_count >= 3:
-            # 如果需要更多点，可以考虑保留一个中心点
-            center_lat = sum(p['lat'] for p in bupt_cluster) / len(bupt_cluster)
-            center_lon = sum(p['lon'] for p in bupt_cluster) / len(bupt_cluster)
+            # 如果需要更多点，可以考虑保留一个中心点（排除已选中的点）
+            center_lat = self.lats[start:end].mean()
+            center_lon = self.lons[start:end].mean()
             
-            min_distance = float('inf')
-            central_point = None
-            for point in bupt_cluster:
-                distance = self.haversine_distance(
-                    point['lat'], point['lon'], center_lat, center_lon
-                )
-                if distance < min_distance and point not in simplified:
-                    min_distance = distance
-                    central_point = point
-            if central_point:
-                simplified.append(central_point)
-        
-        # 确保最终返回的点数不超过设定值，并保持唯一性
-        final_simplified = []
-        seen_ids = set()
-        for p in simplified:
-            if id(p) not in seen_ids:
-                final_simplified.append(p)
-                seen_ids.add(id(p))
+            # 只需找最近的点，比较 haversine 的 a 项即可
+            distances = self._hav_term(slice(start, end), center_lat, center_lon)
+            distances[[idx - start for idx in seen_idx]] = np.inf
+            central = int(np.argmin(distances))
+            if np.isfinite(distances[central]):
+                simplified.append(start + central)
+                seen_idx.add(start + central)
+        
+        # 以上各步已通过 seen_idx 保证唯一性
+        final_simplified = np.array(simplified, dtype=np.int64)
 
         # 如果简化后的点不够数量，从原集群中按时间顺序补充
         if len(final_simplified) < self.bupt_simplified_points_count:
-            remaining_points = [p for p in bupt_cluster if id(p) not in seen_ids]
-            if remaining_points:
-                remaining_points.sort(key=lambda p: p['time'] or datetime.min)
-                final_simplified.extend(remaining_points[:self.bupt_simplified_points_count - len(final_simplified)])
+            remaining = np.array([i for i in range(start, end) if i not in seen_idx], dtype=np.int64)
+            if len(remaining):
+                remaining = remaining[np.argsort(self.times_i64[remaining], kind='stable')]
+                needed = self.bupt_simplified_points_count - len(final_simplified)
+                final_simplified = np.concatenate([final_simplified, remaining[:needed]])
 
         # 确保按时间排序
-        if final_simplified and final_simplified[0]['time']:
-            final_simplified.sort(key=lambda p: p['time'] or datetime.min)
+        if len(final_simplified) and not np.isnat(self.times[final_simplified[0]]):
+            final_simplified = final_simplified[np.argsort(self.times_i64[final_simplified], kind='stable')]
 
-        print(f"BUPT集群 ({len(bupt_cluster)}点) 简化为 {len(final_simplified)}点")
+        print(f"BUPT集群 ({count}点) 简化为 {len(final_simplified)}点")
         return final_simplified
 
     
-    def should_keep_moving_point(self, point, all_points, simplified_points):
-        """判断移动点是否应该保留"""
-        # 如果是BUPT区域预处理后的点，并且已经处理过，就不再保留
-        # 这个逻辑在新的简化流程中可能不再必要，因为BUPT点已经预处理并纳入 simplified_points
-        # 并且id(point) in stay_points_set 会处理停留点。
-        # 这里的判断主要是针对非停留区域的移动点
-        
-        if not simplified_points:
-            return True
+    def should_keep_moving_point(self, point_index, last_index):
+        """
+        判断移动点是否应该保留
         
-        # 计算与最后一个简化点的距离
-        last_point = simplified_points[-1]
-        distance = self.haversine_distance(
-            point['lat'], point['lon'], last_point['lat'], last_point['lon']
-        )
+        Args:
+            point_index: 当前点在 self.lats/self.lons 中的下标
+            last_index: 最后一个已保留点的下标，还没有保留任何点时为 None
+        """
+        if last_index is None:
+            return True
         
-        # 如果距离足够大，保留这个点
-        if distance >= self.moving_threshold:
+        # 如果与最后一个简化点的距离足够大，保留这个点
+        if not self._close_enough(last_index, point_index, self.moving_threshold):
             return True
         
         # 如果是轨迹的关键转折点，也要保留
-        # point_index 是 point 在原始 all_points 中的索引，但现在 all_points 是预处理后的点
-        # 需要找到 point 在当前 points 列表中的索引
         try:
-            point_index = next((i for i, p in enumerate(all_points) if p is point), -1)
-            if self.is_turning_point(point, all_points, point_index):
+            if self.is_turning_point(point_index):
                 return True
         except Exception as e:
-            # 调试信息，如果找不到索引或者is_turning_point出错
-            print(f"Error checking turning point for {point}: {e}")
+            # 调试信息，如果is_turning_point出错
+            print(f"Error checking turning point for index {point_index}: {e}")
             pass
         
         return False
     
-    def is_turning_point(self, point, all_points, point_index, window=5):
-        """判断是否为轨迹转折点"""
-        if point_index < 0 or point_index >= len(all_points): # 确保索引有效
+    def is_turning_point(self, point_index, window=5):
+        """判断第 point_index 个点是否为轨迹转折点"""
+        n_points = len(self.lats)
+        if point_index < 0 or point_index >= n_points: # 确保索引有效
             return False
 
         # 如果点在处理后的列表中的位置不适合计算窗口，则保留
-        if point_index < window or point_index >= len(all_points) - window:
+        if point_index < window or point_index >= n_points - window:
             return True  # 端点保留
         
         # 计算前后方向向量的角度变化
         try:
-            prev_point = all_points[point_index - window]
-            next_point = all_points[point_index + window]
+            if self.bearings is None or self.bearings_window != window:
+                self._precompute_bearings(window)
             
-            # 简单的角度变化检测
-            bearing1 = self.calculate_bearing(prev_point, point)
-            bearing2 = self.calculate_bearing(point, next_point)
-            
-            angle_diff = abs(bearing1 - bearing2)
+            # 前一段为 point_index-window -> point_index，后一段为 point_index -> point_index+window
+            angle_diff = abs(self.bearings[point_index - window] - self.bearings[point_index])
             if angle_diff > 180:
                 angle_diff = 360 - angle_diff
             
@@ -429,85 +572,47 @@ class GPXSimplifier:
             print(f"Error calculating turning point: {e}")
             return False
     
-    def calculate_bearing(self, point1, point2):
-        """计算两点间的方位角"""
-        # 检查是否是同一个点，避免除以零
-        if point1['lat'] == point2['lat'] and point1['lon'] == point2['lon']:
-            return 0.0 # 或者其他约定值
-            
-        lat1, lon1 = radians(point1['lat']), radians(point1['lon'])
-        lat2, lon2 = radians(point2['lat']), radians(point2['lon'])
-        
-        dlon = lon2 - lon1
-        
-        y = sin(dlon) * cos(lat2)
-        x = cos(lat1) * sin(lat2) - sin(lat1) * cos(lat2) * cos(dlon)
-        
-        bearing = np.arctan2(y, x)
-        return np.degrees(bearing)
-    
-    def is_stay_area(self, area_points):
-        """判断是否为停留区域"""
-        if len(area_points) < 2:
-            return False
+    def simplify_stay_area(self, start, end):
+        """
+        简化停留区域的点 - 更激进的简化策略
         
-        # 如果有时间信息，检查停留时间
-        if area_points[0]['time'] and area_points[-1]['time']:
-            stay_duration = (area_points[-1]['time'] - area_points[0]['time']).total_seconds()
-            return stay_duration >= self.min_stay_time
+        Args:
+            start, end: 停留区域在 self.lats/self.lons 中的 [start, end) 范围
         
-        # 如果没有时间信息，根据点数判断（假设采样频率固定）
-        return len(area_points) >= 10  # 可调整这个阈值
-    
-    def simplify_stay_area(self, area_points):
-        """简化停留区域的点 - 更激进的简化策略"""
-        if len(area_points) <= self.max_stay_points:
-            return area_points
+        Returns:
+            保留点的下标列表
+        """
+        count = end - start
+        if count <= self.max_stay_points:
+            return list(range(start, end))
         
         if self.max_stay_points == 1:
             # 只保留中心点
-            center_lat = sum(p['lat'] for p in area_points) / len(area_points)
-            center_lon = sum(p['lon'] for p in area_points) / len(area_points)
-            
-            # 找到最接近中心的点
-            min_distance = float('inf')
-            center_point = area_points[0]
-            for point in area_points:
-                distance = self.haversine_distance(
-                    point['lat'], point['lon'], center_lat, center_lon
-                )
-                if distance < min_distance:
-                    min_distance = distance
-                    center_point = point
+            center_lat = self.lats[start:end].mean()
+            center_lon = self.lons[start:end].mean()
             
-            return [center_point]
+            # 找到最接近中心的点（只需比较远近，使用 haversine 的 a 项即可）
+            distances = self._hav_term(slice(start, end), center_lat, center_lon)
+            return [start + int(np.argmin(distances))]
         
         elif self.max_stay_points == 2:
             # 保留第一个和最后一个点
-            return [area_points[0], area_points[-1]]
+            return [start, end - 1]
         
         else:
             # 保留第一个点、最后一个点，以及中间的关键点
-            simplified = [area_points[0]]  # 起始点
+            simplified = [start]  # 起始点
             
             if self.max_stay_points > 2:
                 # 在中间点中均匀选择，但更少
                 middle_count = min(self.max_stay_points - 2, 1)  # 中间最多1个点
                 if middle_count > 0:
-                    middle_index = len(area_points) // 2
-                    simplified.append(area_points[middle_index])
+                    simplified.append(start + count // 2)
             
-            simplified.append(area_points[-1])  # 结束点
+            simplified.append(end - 1)  # 结束点
             
             # 确保不重复添加
-            final_simplified = []
-            seen_ids = set()
-            for p in simplified:
-                if id(p) not in seen_ids:
-                    final_simplified.append(p)
-                    seen_ids.add(id(p))
-            
-            return final_simplified
+            return list(dict.fromkeys(simplified))
     
     def simplify_gpx(self, input_file, output_file):
         """简化GPX文件 - 这个方法在最新的修改中实际上被 simplify_gpx_improved 替代了，但为了兼容性保留"""
@@ -519,40 +624,63 @@ class GPXSimplifier:
         # 实际上，这里可以简单地调用 simplify_gpx_improved
         self.simplify_gpx_improved(input_file, output_file)
     
-    def create_simplified_gpx(self, points, original_tree, original_root, ns, output_file):
-        """创建简化后的GPX文件"""
-        # 创建新的GPX结构
-        new_root = ET.Element('gpx')
-        new_root.set('version', '1.1')
-        new_root.set('creator', 'GPX Simplifier') # 更新creator信息
-        
+    def create_simplified_gpx(self, indices, ns, output_file):
+        """
+        创建简化后的GPX文件，indices 为要写出的点在 self.lats/self.lons/self.times 中的下标。
+        输出结构固定，直接拼接格式化好的文本一次写出，不再构建和缩进XML树。
+        """
         # 添加命名空间
-        if ns.get('gpx'):
-            new_root.set('xmlns', ns['gpx'])
-        
-        # 创建轨迹
-        trk = ET.SubElement(new_root, 'trk')
-        trk_name = ET.SubElement(trk, 'name')
-        trk_name.text = 'Simplified Track' # 更新轨迹名称
-        
-        trkseg = ET.SubElement(trk, 'trkseg')
+        xmlns = f' xmlns={quoteattr(ns["gpx"])}' if ns.get('gpx') else ''
+        lines = [
+            "<?xml version='1.0' encoding='utf-8'?>",
+            f'<gpx version="1.1" creator="GPX Simplifier"{xmlns}>', # 更新creator信息
+            '  <trk>',
+            '    <name>Simplified Track</name>', # 更新轨迹名称
+            '    <trkseg>',
+        ]
+        
+        # 时间批量格式化，有小数秒时保留到微秒（与 datetime.isoformat 一致）
+        times = self.times[indices]
+        has_fraction = self.times_i64[indices] % 1000000000 != 0
+        time_strs = np.where(has_fraction,
+                             np.datetime_as_string(times, unit='us'),
+                             np.datetime_as_string(times, unit='s')).tolist()
+        
+        # 添加简化后的点，坐标固定保留7位小数（约1厘米）
+        for lat, lon, time_str, no_time in zip(self.lats[indices].tolist(), self.lons[indices].tolist(),
+                                               time_strs, np.isnat(times).tolist()):
+            if no_time:
+                lines.append(f'      <trkpt lat="{lat:.7f}" lon="{lon:.7f}" />')
+            else:
+                lines.append(f'      <trkpt lat="{lat:.7f}" lon="{lon:.7f}">')
+                lines.append(f'        <time>{time_str}Z</time>')
+                lines.append('      </trkpt>')
         
-        # 添加简化后的点
-        for point in points:
-            trkpt = ET.SubElement(trkseg, 'trkpt')
-            trkpt.set('lat', str(point['lat']))
-            trkpt.set('lon', str(point['lon']))
-            
-            if point['time']:
-                time_elem = ET.SubElement(trkpt, 'time')
-                time_elem.text = point['time'].isoformat() + 'Z'
+        lines.append('    </trkseg>')
+        lines.append('  </trk>')
+        lines.append('</gpx>')
         
         # 写入文件
-        tree = ET.ElementTree(new_root)
-        ET.indent(tree, space="  ", level=0)
-        tree.write(output_file, encoding='utf-8', xml_declaration=True)
+        with open(output_file, 'wb') as f:
+            f.write('\n'.join(lines).encode('utf-8'))
         print(f"简化后的GPX文件已保存到: {output_file}")
 
+def process_gpx_file(simplifier, input_file, output_file):
+    """简化单个GPX文件（在子进程中运行，每个文件相互独立）"""
+    try:
+        print(f"开始处理文件: {input_file}")
+        # 调用改进的简化方法
+        simplifier.simplify_gpx_improved(input_file, output_file)
+    except FileNotFoundError:
+        print(f"文件 {input_file} 不存在，请检查文件路径")
+    except ET.ParseError as e:
+        print(f"GPX文件格式错误: {e}")
+        print("请确保文件是有效的GPX格式")
+    except Exception as e:
+        print(f"处理过程中出现错误: {e}")
+        import traceback
+        traceback.print_exc()
+
 # 使用示例
 def main():
     # 创建简化器实例
@@ -570,25 +698,17 @@ def main():
         os.makedirs(simplified_folder)
     
     # 遍历Original文件夹中的所有GPX文件
+    input_files = []
+    output_files = []
     for filename in os.listdir(original_folder):
         if filename.endswith('.gpx'):
-            input_file = os.path.join(original_folder, filename)
+            input_files.append(os.path.join(original_folder, filename))
             base_name = os.path.splitext(filename)[0]
-            output_file = os.path.join(simplified_folder, f'{base_name}_simplified.gpx') # 新的文件名后缀
-            
-            try:
-                print(f"开始处理文件: {input_file}")
-                # 调用改进的简化方法
-                simplifier.simplify_gpx_improved(input_file, output_file)
-            except FileNotFoundError:
-                print(f"文件 {input_file} 不存在，请检查文件路径")
-            except ET.ParseError as e:
-                print(f"GPX文件格式错误: {e}")
-                print("请确保文件是有效的GPX格式")
-            except Exception as e:
-                print(f"处理过程中出现错误: {e}")
-                import traceback
-                traceback.print_exc()
+            output_files.append(os.path.join(simplified_folder, f'{base_name}_simplified.gpx')) # 新的文件名后缀
+    
+    # 各文件互不相关，用多进程并行处理
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(process_gpx_file, repeat(simplifier), input_files, output_files))
 
 def check_gpx_file(file_path):
     """检查GPX文件的基本信息"""
@@ -608,6 +728,8 @@ def check_gpx_file(file_path):
         # 统计不同类型的元素
         element_count = {}
         for elem in all_elements:
+            if not isinstance(elem.tag, str):
+                continue  # lxml会遍历到注释和处理指令
             tag = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
             element_count[tag] = element_count.get(tag, 0) + 1
         
@@ -1,9 +1,75 @@
 import os
-import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:
+    # 未安装lxml时使用标准库，接口相同只是更慢
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
+# 合并文件使用的命名空间；各版本GPX（如简化脚本输出的 1.1）的轨迹点都会被移到这个命名空间下
+GPX_NS = "http://www.topografix.com/GPX/1/0"
+GPX_NS_PREFIX = "{http://www.topografix.com/GPX/"
+if not HAS_LXML:
+    ET.register_namespace("", GPX_NS) # 注册默认命名空间
+
+# 合并文件的开头和结尾，所有轨迹点都放在同一个<trkseg>中
+GPX_HEADER = b"""<?xml version='1.0' encoding='utf-8'?>
+<gpx xmlns="http://www.topografix.com/GPX/1/0" version="1.1" creator="GPX Merger Script">
+  <trk>
+    <name>Merged Track (All Files)</name>
+    <trkseg>
+"""
+GPX_FOOTER = b"""    </trkseg>
+  </trk>
+</gpx>"""
+
+def _to_output_namespace(elem):
+    """把轨迹点及其子元素中属于任意版本GPX或没有命名空间的元素移到 GPX_NS 下，扩展（如 gpxtpx:）保持不变"""
+    for node in elem.iter():
+        tag = node.tag
+        if not isinstance(tag, str):
+            # 注释和处理指令
+            continue
+        if tag.startswith('{'):
+            if not tag.startswith(GPX_NS_PREFIX):
+                continue
+            tag = tag.rsplit('}', 1)[1]
+        node.tag = f'{{{GPX_NS}}}{tag}'
+
+def iter_trkpt_bytes(gpx_file_path):
+    """
+    流式读取GPX文件，逐个返回轨迹点序列化后的字节串，读完的点立即释放。
+    轨迹点先移到合并文件的命名空间下；序列化时会在轨迹点上重新声明它用到的命名空间，
+    所以片段放到新文件中依然是合法的XML。
+    """
+    if HAS_LXML:
+        context = ET.iterparse(gpx_file_path, events=('end',), tag='{*}trkpt')
+        # 轨迹点挂到声明了默认命名空间的 trkseg 下再序列化，输出 <trkpt xmlns=...> 而不是 ns0: 前缀
+        trkseg = ET.Element(f'{{{GPX_NS}}}trkseg', nsmap={None: GPX_NS})
+    else:
+        context = ET.iterparse(gpx_file_path, events=('end',))
+    for _, elem in context:
+        if not HAS_LXML and elem.tag.rsplit('}', 1)[-1] != 'trkpt':
+            continue
+        # 不带上原文件中轨迹点后面的空白
+        elem.tail = None
+        _to_output_namespace(elem)
+        if HAS_LXML:
+            # append 会把轨迹点从原文件的树中移走，读完的点不会留在内存中
+            trkseg.append(elem)
+            ET.cleanup_namespaces(trkseg)
+            yield ET.tostring(elem, encoding='utf-8')
+            trkseg.remove(elem)
+        else:
+            yield ET.tostring(elem, encoding='utf-8')
+            elem.clear()
 
 def merge_gpx_files_with_counts(input_dir):
     """
     合并指定目录下所有GPX文件的轨迹数据到一个新的GPX文件，并统计点数。
+    各文件流式解析，轨迹点逐个序列化后写入同一个<trkseg>，不在内存中构建合并后的整棵树。
 
     Args:
         input_dir (str): 包含GPX文件的输入目录。
@@ -14,16 +80,6 @@ def merge_gpx_files_with_counts(input_dir):
     # 创建输出子目录（如果不存在）
     os.makedirs(output_subdir, exist_ok=True)
 
-    # 初始化一个新的GPX根元素
-    gpx_namespace = "http://www.topografix.com/GPX/1/0"
-    ET.register_namespace("", gpx_namespace) # 注册默认命名空间
-    merged_gpx = ET.Element("{%s}gpx" % gpx_namespace, version="1.1", creator="GPX Merger Script")
-    
-    # 初始化一个<trk>元素和<trkseg>元素来存放所有轨迹点
-    merged_trk = ET.SubElement(merged_gpx, "{%s}trk" % gpx_namespace)
-    ET.SubElement(merged_trk, "{%s}name" % gpx_namespace).text = "Merged Track (All Files)"
-    merged_trkseg = ET.SubElement(merged_trk, "{%s}trkseg" % gpx_namespace)
-
     gpx_files = [f for f in os.listdir(input_dir) if f.endswith('.gpx')]
 
     if not gpx_files:
@@ -34,31 +90,28 @@ def merge_gpx_files_with_counts(input_dir):
 
     total_merged_points = 0
     
-    for filename in gpx_files:
-        filepath = os.path.join(input_dir, filename)
-        file_point_count = 0
-        try:
-            tree = ET.parse(filepath)
-            root = tree.getroot()
-
-            # 遍历所有的<trkseg>并提取<trkpt>
-            for trkseg in root.findall(".//{%s}trkseg" % gpx_namespace):
-                for trkpt in trkseg.findall(".//{%s}trkpt" % gpx_namespace):
-                    # 将轨迹点添加到合并的<trkseg>中
-                    merged_trkseg.append(trkpt)
-                    file_point_count += 1
-            total_merged_points += file_point_count
-            print(f"已处理文件: {filename} - 包含 {file_point_count} 个轨迹点。")
-        except ET.ParseError as e:
-            print(f"解析文件 '{filename}' 时出错: {e}")
-        except Exception as e:
-            print(f"处理文件 '{filename}' 时发生未知错误: {e}")
-
-    # 将合并后的GPX数据写入文件
-    tree = ET.ElementTree(merged_gpx)
     try:
-        ET.indent(tree, space="  ", level=0) 
-        tree.write(output_filepath, encoding="utf-8", xml_declaration=True)
+        with open(output_filepath, 'wb') as out:
+            out.write(GPX_HEADER)
+            for filename in gpx_files:
+                filepath = os.path.join(input_dir, filename)
+                try:
+                    # 整个文件解析成功后才写出，格式有误的文件整个跳过
+                    fragments = list(iter_trkpt_bytes(filepath))
+                except ET.ParseError as e:
+                    print(f"解析文件 '{filename}' 时出错: {e}")
+                    continue
+                except Exception as e:
+                    print(f"处理文件 '{filename}' 时发生未知错误: {e}")
+                    continue
+                for fragment in fragments:
+                    out.write(b'      ')
+                    out.write(fragment)
+                    out.write(b'\n')
+                file_point_count = len(fragments)
+                total_merged_points += file_point_count
+                print(f"已处理文件: {filename} - 包含 {file_point_count} 个轨迹点。")
+            out.write(GPX_FOOTER)
         print(f"\n所有GPX文件已成功合并到: {output_filepath}")
         print(f"合并后的文件共包含 {total_merged_points} 个轨迹点。")
     except Exception as e:
@@ -1,6 +1,57 @@
 import os
-import gpxpy
 import csv
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:
+    # 未安装lxml时使用标准库，接口相同只是更慢
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
+# 每攒够这么多行写一次 CSV
+BATCH_SIZE = 8192
+
+def iter_trkpts(gpx_file_path):
+    """流式读取 GPX 文件中的轨迹点，逐个返回 (纬度, 经度, 时间) 原始字符串，读完的点立即释放"""
+    if HAS_LXML:
+        context = ET.iterparse(gpx_file_path, events=('end',), tag='{*}trkpt')
+    else:
+        context = ET.iterparse(gpx_file_path, events=('end',))
+    for _, elem in context:
+        if not HAS_LXML and elem.tag.rsplit('}', 1)[-1] != 'trkpt':
+            continue
+        time_text = elem.findtext('{*}time')
+        yield elem.get('lat'), elem.get('lon'), time_text.strip() if time_text else ''
+        elem.clear()
+        if HAS_LXML:
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+# 转换单个 GPX 文件为 CSV（在子进程中运行，每个文件相互独立）
+def convert_one_file(gpx_file_path, csv_file_path):
+    print(f"正在读取文件: {gpx_file_path}")  # 输出正在读取的文件信息
+    # 解析 GPX 文件并写入 CSV；先写到临时文件，整个文件解析成功后才改名，格式有误的文件不留下残缺的 CSV
+    tmp_path = csv_file_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as csv_f:
+            writer = csv.writer(csv_f)
+            # 写入表头，可根据 GPX 实际包含信息调整，这里示例写经纬度、时间
+            writer.writerow(["Latitude", "Longitude", "Time"])
+            rows = []
+            for row in iter_trkpts(gpx_file_path):
+                rows.append(row)
+                if len(rows) >= BATCH_SIZE:
+                    writer.writerows(rows)
+                    rows.clear()
+            writer.writerows(rows)
+        os.replace(tmp_path, csv_file_path)
+        print(f"    成功转换为: {csv_file_path}")  # 输出成功转换的文件信息
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"处理文件 {gpx_file_path} 时出错: {e}")
 
 # 遍历目录，转换 GPX 文件为 CSV 的函数
 def convert_gpx_to_csv(root_dir):
@@ -8,6 +59,8 @@ def convert_gpx_to_csv(root_dir):
     csv_root = os.path.join(root_dir, "csv")
     os.makedirs(csv_root, exist_ok=True)
     
+    gpx_files = []
+    csv_files = []
     # 遍历目录
     for dirpath, dirnames, filenames in os.walk(root_dir):
         # 跳过 csv 文件夹本身，避免重复处理
@@ -15,29 +68,16 @@ def convert_gpx_to_csv(root_dir):
             continue
         for filename in filenames:
             if filename.endswith(".gpx"):
-                gpx_file_path = os.path.join(dirpath, filename)
-                print(f"正在读取文件: {gpx_file_path}")  # 输出正在读取的文件信息
+                gpx_files.append(os.path.join(dirpath, filename))
                 # 构建对应的 CSV 存储路径
                 relative_path = os.path.relpath(dirpath, root_dir)
                 csv_dir = os.path.join(csv_root, relative_path)
                 os.makedirs(csv_dir, exist_ok=True)
-                csv_file_path = os.path.join(csv_dir, filename.replace(".gpx", ".csv"))
-                
-                # 解析 GPX 文件并写入 CSV
-                try:
-                    with open(gpx_file_path, 'r', encoding='utf-8') as gpx_f:
-                        gpx = gpxpy.parse(gpx_f)
-                        with open(csv_file_path, 'w', newline='', encoding='utf-8') as csv_f:
-                            writer = csv.writer(csv_f)
-                            # 写入表头，可根据 GPX 实际包含信息调整，这里示例写经纬度、时间
-                            writer.writerow(["Latitude", "Longitude", "Time"])
-                            for track in gpx.tracks:
-                                for segment in track.segments:
-                                    for point in segment.points:
-                                        writer.writerow([point.latitude, point.longitude, point.time])
-                    print(f"    成功转换为: {csv_file_path}")  # 输出成功转换的文件信息
-                except Exception as e:
-                    print(f"处理文件 {gpx_file_path} 时出错: {e}")
+                csv_files.append(os.path.join(csv_dir, filename.replace(".gpx", ".csv")))
+    
+    # 各文件互不相关，用多进程并行转换
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(convert_one_file, gpx_files, csv_files))
 
 if __name__ == "__main__":
     # 当前脚本所在目录，可根据实际情况修改为要处理的根目录
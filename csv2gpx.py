@@ -3,178 +3,710 @@
 
 import csv
 import datetime
-from xml.dom import minidom
-from xml.etree.ElementTree import Element, SubElement, tostring
+import heapq
+import mmap
+import shutil
+import tempfile
+from itertools import chain, islice
+from math import isnan
+from operator import itemgetter
+from xml.sax.saxutils import XMLGenerator
 # import argparse  # 不再需要命令行参数解析
 import os
+import numpy as np
 
-def timestamp_to_iso(timestamp):
-    """将时间戳转换为ISO格式的时间字符串"""
+try:
+    import pandas as pd
+    HAS_PANDAS = True
+except ImportError:
+    HAS_PANDAS = False
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    # 未安装numba时不使用逐字节解析器（纯Python执行太慢）
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+REQUIRED_COLUMNS = ['dataTime', 'longitude', 'latitude']
+
+# 读入后每个点的字段（与 CSV 列名一一对应），缺失的可选值为 nan
+RECORD_COLUMNS = ['dataTime', 'latitude', 'longitude', 'altitude', 'speed', 'accuracy']
+RECORD_DTYPE = np.dtype([('timestamp', np.int64), ('latitude', np.float64), ('longitude', np.float64),
+                         ('altitude', np.float64), ('speed', np.float64), ('accuracy', np.float64)])
+
+# 分块读取的大小：标准库 csv 和 pandas 按行数，numba 解析器按字节数；写出时每批的行数
+CHUNK_ROWS = 500_000
+CHUNK_BYTES = 32 * 1024 * 1024
+BATCH_ROWS = 65536
+# 无效行只保留前几行作为示例，读完后与总数一起输出
+MAX_BAD_SAMPLES = 10
+
+# datetime 能表示的最大秒级时间戳（9999-12-31T23:59:59Z），更大的只可能是毫秒级
+MAX_SECONDS_TIMESTAMP = 253402300799
+# 能写成合法GPX时间的范围：最早为秒级的公元1年1月1日，最晚为毫秒级的 9999-12-31T23:59:59.999Z，超出的行视为无效
+MIN_TIMESTAMP = -62135596800
+MAX_TIMESTAMP = 253402300799999
+
+# 各层级的换行加缩进（紧凑输出时全为空串），以及无属性元素共用的空属性表，避免每个点重复创建
+INDENT = ['\n' + '  ' * depth for depth in range(6)]
+NO_INDENT = [''] * len(INDENT)
+NO_ATTRS = {}
+
+# 可以用一次乘除法精确得到的10的幂（Clinger 快速路径）
+POW10 = np.array([10.0 ** k for k in range(23)])
+
+# 解析结果：成功、无效、需要交给 Python 重新解析（位数太多，快速路径无法保证精确）
+PARSE_OK = 0
+PARSE_INVALID = 1
+PARSE_SLOW = 2
+
+# int() 能接受的整数写法（前后空白、正负号、数字间的下划线），pandas 路径用它校验时间戳
+INT_PATTERN = r'\s*[+-]?\d+(?:_\d+)*\s*'
+
+@njit(cache=True)
+def _strip(buf, start, end):
+    """去掉字段首尾的空格和制表符"""
+    while start < end and (buf[start] == 32 or buf[start] == 9):
+        start += 1
+    while end > start and (buf[end - 1] == 32 or buf[end - 1] == 9):
+        end -= 1
+    return start, end
+
+@njit(cache=True)
+def _parse_int(buf, start, end):
+    """解析 buf[start:end] 中的十进制整数，返回 (值, 状态)"""
+    start, end = _strip(buf, start, end)
+    neg = False
+    if start < end and (buf[start] == 45 or buf[start] == 43):
+        neg = buf[start] == 45
+        start += 1
+    if start == end:
+        return 0, PARSE_INVALID
+    if end - start > 18:
+        return 0, PARSE_SLOW
+    value = 0
+    for i in range(start, end):
+        c = buf[i]
+        if c == 95:
+            # 数字分隔符 "_" 交给 int()
+            return 0, PARSE_SLOW
+        if c < 48 or c > 57:
+            return 0, PARSE_INVALID
+        value = value * 10 + (c - 48)
+    return (-value if neg else value), PARSE_OK
+
+@njit(cache=True)
+def _parse_float(buf, start, end):
+    """
+    解析 buf[start:end] 中的十进制小数，返回 (值, 状态)
+    
+    有效数字不超过 2**53 且十进制指数在 ±22 以内时，一次乘除法的结果与 float() 完全相同；
+    其余情况返回 PARSE_SLOW，由调用方用 float() 解析
+    """
+    start, end = _strip(buf, start, end)
+    neg = False
+    if start < end and (buf[start] == 45 or buf[start] == 43):
+        neg = buf[start] == 45
+        start += 1
+    mantissa = 0
+    n_digits = 0
+    scale = 0
+    seen_digit = False
+    seen_dot = False
+    i = start
+    while i < end:
+        c = buf[i]
+        if 48 <= c <= 57:
+            seen_digit = True
+            if mantissa != 0 or c != 48:
+                if n_digits >= 18:
+                    return np.nan, PARSE_SLOW
+                mantissa = mantissa * 10 + (c - 48)
+                n_digits += 1
+            if seen_dot:
+                scale -= 1
+        elif c == 46 and not seen_dot:
+            seen_dot = True
+        elif c == 95:
+            # 数字分隔符 "_" 交给 float()
+            return np.nan, PARSE_SLOW
+        else:
+            break
+        i += 1
+    if not seen_digit:
+        # nan、inf 之类的写法交给 float()
+        return np.nan, (PARSE_SLOW if i < end else PARSE_INVALID)
+    if i < end and (buf[i] == 101 or buf[i] == 69):
+        i += 1
+        exp_neg = False
+        if i < end and (buf[i] == 45 or buf[i] == 43):
+            exp_neg = buf[i] == 45
+            i += 1
+        if i == end:
+            return np.nan, PARSE_INVALID
+        exponent = 0
+        while i < end and 48 <= buf[i] <= 57:
+            if exponent < 10000:
+                exponent = exponent * 10 + (buf[i] - 48)
+            i += 1
+        scale += -exponent if exp_neg else exponent
+    if i != end:
+        return np.nan, PARSE_INVALID
+    if mantissa > 2 ** 53 or scale < -22 or scale > 22:
+        return np.nan, PARSE_SLOW
+    value = float(mantissa)
+    if scale < 0:
+        value /= POW10[-scale]
+    else:
+        value *= POW10[scale]
+    return (-value if neg else value), PARSE_OK
+
+@njit(cache=True)
+def _parse_csv_bytes(buf, start, idx_t, idx_lat, idx_lon, idx_alt, idx_speed, idx_acc):
+    """
+    逐字节扫描CSV数据（从 start 开始，不含表头），解析需要的列
+    
+    Returns:
+        (时间戳, 纬度, 经度, 海拔, 速度, 精度, 每行状态, 每行起止偏移)，空行被跳过
+    """
+    n = len(buf)
+    n_lines = 1
+    for i in range(start, n):
+        if buf[i] == 10:
+            n_lines += 1
+    
+    timestamps = np.empty(n_lines, np.int64)
+    lats = np.empty(n_lines, np.float64)
+    lons = np.empty(n_lines, np.float64)
+    alts = np.empty(n_lines, np.float64)
+    speeds = np.empty(n_lines, np.float64)
+    accs = np.empty(n_lines, np.float64)
+    status = np.empty(n_lines, np.uint8)
+    bounds = np.empty((n_lines, 2), np.int64)
+    
+    k = 0
+    pos = start
+    while pos < n:
+        line_end = pos
+        while line_end < n and buf[line_end] != 10:
+            line_end += 1
+        end = line_end
+        if end > pos and buf[end - 1] == 13:
+            end -= 1
+        
+        if end > pos:
+            t_state = lat_state = lon_state = PARSE_INVALID
+            row_state = PARSE_OK
+            timestamps[k] = 0
+            lats[k] = lons[k] = alts[k] = speeds[k] = accs[k] = np.nan
+            col = 0
+            field_start = pos
+            for i in range(pos, end + 1):
+                if i < end and buf[i] != 44:
+                    continue
+                if col == idx_t:
+                    timestamps[k], t_state = _parse_int(buf, field_start, i)
+                elif col == idx_lat:
+                    lats[k], lat_state = _parse_float(buf, field_start, i)
+                elif col == idx_lon:
+                    lons[k], lon_state = _parse_float(buf, field_start, i)
+                elif col == idx_alt or col == idx_speed or col == idx_acc:
+                    value, state = _parse_float(buf, field_start, i)
+                    if state == PARSE_SLOW:
+                        row_state = PARSE_SLOW
+                    if col == idx_alt:
+                        alts[k] = value
+                    elif col == idx_speed:
+                        speeds[k] = value
+                    elif col == idx_acc:
+                        accs[k] = value
+                col += 1
+                field_start = i + 1
+            
+            if t_state == PARSE_INVALID or lat_state == PARSE_INVALID or lon_state == PARSE_INVALID:
+                row_state = PARSE_INVALID
+            elif t_state == PARSE_SLOW or lat_state == PARSE_SLOW or lon_state == PARSE_SLOW:
+                row_state = PARSE_SLOW
+            status[k] = row_state
+            bounds[k, 0] = pos
+            bounds[k, 1] = end
+            k += 1
+        
+        pos = line_end + 1
+    
+    return (timestamps[:k], lats[:k], lons[:k], alts[:k], speeds[:k], accs[:k],
+            status[:k], bounds[:k])
+
+def format_times(timestamps):
+    """
+    在C层批量格式化一组时间戳（秒或毫秒级别的 int64 数组），返回不带时区后缀的ISO时间字符串列表，
+    与 datetime.fromtimestamp(..., tz=utc).isoformat() 去掉 "+00:00" 后相同
+    """
+    # 超出秒级范围的按毫秒级别处理
+    millis = timestamps > MAX_SECONDS_TIMESTAMP
+    times = np.where(millis, timestamps, timestamps * 1000).astype('datetime64[ms]')
+    time_strs = np.datetime_as_string(times, unit='s').tolist()
+    
+    # 毫秒不为0时与 isoformat 一样输出6位小数
+    fraction = np.flatnonzero(millis & (timestamps % 1000 != 0))
+    if len(fraction):
+        for i, time_str in zip(fraction.tolist(), np.datetime_as_string(times[fraction], unit='us').tolist()):
+            time_strs[i] = time_str
+    return time_strs
+
+def format_column(values, fmt):
+    """用一次 % 格式化把一列浮点数整体转成字符串列表，比逐个 f-string 或 np.char.mod 都快"""
+    strs = (f'{fmt}\n' * len(values) % tuple(values.tolist())).split('\n')
+    strs.pop()
+    return strs
+
+def _write_text_element(gen, indent, tag, text):
+    """写出一个只含文本的子元素，indent 为元素前的换行和缩进"""
+    gen.ignorableWhitespace(indent)
+    gen.startElement(tag, NO_ATTRS)
+    gen.characters(text)
+    gen.endElement(tag)
+
+def _parse_optional(value):
+    """解析可选的数值列，缺失或无法解析时返回 nan"""
+    if not value:
+        return float('nan')
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+def _parse_timestamp(value):
+    """用 int() 解析时间戳，超出 MIN_TIMESTAMP ~ MAX_TIMESTAMP 时抛出 ValueError"""
+    timestamp = int(value)
+    if not MIN_TIMESTAMP <= timestamp <= MAX_TIMESTAMP:
+        raise ValueError(f"时间戳超出范围: {timestamp}")
+    return timestamp
+
+def _bad_row_sample(row, indices):
+    """用 int()/float() 重新解析一行的必要字段，返回作为无效行示例的 (行, 错误)"""
+    idx_t, idx_lat, idx_lon = indices[:3]
+    try:
+        _parse_timestamp(row[idx_t])
+        float(row[idx_lat])
+        float(row[idx_lon])
+    except (ValueError, IndexError, OverflowError) as e:
+        return row, e
+    return row, '无效的数值'
+
+def _column_indices(header):
+    """
+    按 RECORD_DTYPE 的字段顺序返回各列的下标，可选列不存在时为 -1；
+    缺少必要的列时打印警告并返回 None
+    """
+    # 检查是否有必要的列
+    if not all(col in header for col in REQUIRED_COLUMNS):
+        print(f"警告: CSV文件缺少必要的列。需要: {REQUIRED_COLUMNS}")
+        print(f"实际列: {header}")
+        return None
+    return tuple(header.index(col) if col in header else -1 for col in RECORD_COLUMNS)
+
+def _make_chunk(*columns):
+    """把各列数组组装成 RECORD_DTYPE 结构化数组"""
+    chunk = np.empty(len(columns[0]), dtype=RECORD_DTYPE)
+    for name, column in zip(RECORD_DTYPE.names, columns):
+        chunk[name] = column
+    return chunk
+
+def _parse_rows(rows, indices):
+    """把已切分的CSV行解析成 RECORD_DTYPE 数组，返回 (数组, 无效行数, 无效行示例)"""
+    idx_t, idx_lat, idx_lon, idx_alt, idx_speed, idx_acc = indices
+    
+    # 可选列是否存在只判断一次，不存在的列整列为 nan
+    has_alt, has_speed, has_acc = idx_alt >= 0, idx_speed >= 0, idx_acc >= 0
+    
+    # 按行数预分配各列，一次遍历完成校验和解析，每行只转换一次
+    n_rows = len(rows)
+    timestamps = np.empty(n_rows, dtype=np.int64)
+    lats = np.empty(n_rows)
+    lons = np.empty(n_rows)
+    alts = np.empty(n_rows) if has_alt else np.full(n_rows, np.nan)
+    speeds = np.empty(n_rows) if has_speed else np.full(n_rows, np.nan)
+    accs = np.empty(n_rows) if has_acc else np.full(n_rows, np.nan)
+    k = 0
+    n_blank = 0
+    bad_samples = []
+    for row in rows:
+        if not row:
+            # 空行（csv.reader 返回 []）直接跳过，不算无效行
+            n_blank += 1
+            continue
+        try:
+            # 验证基本数据，写入第 k 行；无效时 k 不前进，这一行会被下一行覆盖
+            timestamps[k] = _parse_timestamp(row[idx_t])
+            lats[k] = float(row[idx_lat])
+            lons[k] = float(row[idx_lon])
+        except (ValueError, IndexError, OverflowError) as e:
+            if len(bad_samples) < MAX_BAD_SAMPLES:
+                bad_samples.append((row, e))
+            continue
+        
+        if has_alt:
+            alts[k] = _parse_optional(row[idx_alt]) if idx_alt < len(row) else np.nan
+        if has_speed:
+            speeds[k] = _parse_optional(row[idx_speed]) if idx_speed < len(row) else np.nan
+        if has_acc:
+            accs[k] = _parse_optional(row[idx_acc]) if idx_acc < len(row) else np.nan
+        k += 1
+    
+    chunk = _make_chunk(timestamps[:k], lats[:k], lons[:k], alts[:k], speeds[:k], accs[:k])
+    return chunk, n_rows - n_blank - k, bad_samples
+
+def iter_chunks_csv(csv_file, indices):
+    """用标准库 csv 分块读取，每块最多 CHUNK_ROWS 行，逐块生成 (RECORD_DTYPE 数组, 无效行数, 无效行示例)"""
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # 跳过表头
+        while True:
+            rows = list(islice(reader, CHUNK_ROWS))
+            if not rows:
+                break
+            yield _parse_rows(rows, indices)
+
+def iter_chunks_pandas(csv_file, indices):
+    """用 pandas 在C层分块读取并解析，每块最多 CHUNK_ROWS 行，逐块生成 (RECORD_DTYPE 数组, 无效行数, 无效行示例)"""
+    # 全部按字符串读入，脏数据只影响所在的行；
+    # 只读到用到的最后一列，多出字段的行与 csv.reader 一样保留，而不是被当作坏行丢掉
+    with pd.read_csv(csv_file, dtype=str, keep_default_na=False, usecols=range(max(indices) + 1),
+                     chunksize=CHUNK_ROWS) as reader:
+        for df in reader:
+            def to_int(idx):
+                col = df.iloc[:, idx]
+                # 与 int() 一样只接受整数写法，小数和科学计数法无效
+                valid = col.str.fullmatch(INT_PATTERN, na=False).to_numpy(copy=True)
+                values = np.zeros(len(df), dtype=np.int64)
+                try:
+                    values[valid] = col[valid].astype('int64').to_numpy()
+                except OverflowError:
+                    # 有超出 int64 范围的值（很少见），逐个转换找出来
+                    for k in np.flatnonzero(valid):
+                        try:
+                            values[k] = int(col.iat[k])
+                        except OverflowError:
+                            valid[k] = False
+                return values, valid
+            
+            def to_float(idx):
+                # 返回 (值, 是否有效)，无效或缺失的值为 nan
+                if idx < 0:
+                    return np.full(len(df), np.nan), np.zeros(len(df), dtype=bool)
+                col = df.iloc[:, idx]
+                # to_numeric 只用来判断能否解析，数值本身用 astype 解析，与 float() 的结果一致
+                valid = pd.to_numeric(col, errors='coerce').notna().to_numpy(copy=True)
+                values = col.where(valid, 'nan').astype('float64').to_numpy(copy=True)
+                # to_numeric 不认、float() 却接受的写法（如 nan、带下划线的数字）逐个补上，这样的值很少
+                for k in np.flatnonzero(~valid):
+                    value = col.iat[k]
+                    if isinstance(value, str) and value.strip():
+                        try:
+                            values[k] = float(value)
+                            valid[k] = True
+                        except ValueError:
+                            pass
+                return values, valid
+            
+            idx_t, idx_lat, idx_lon, idx_alt, idx_speed, idx_acc = indices
+            timestamps, valid = to_int(idx_t)
+            valid &= (timestamps >= MIN_TIMESTAMP) & (timestamps <= MAX_TIMESTAMP)
+            lats, lat_valid = to_float(idx_lat)
+            lons, lon_valid = to_float(idx_lon)
+            
+            # 跳过时间或经纬度无效的行
+            valid &= lat_valid & lon_valid
+            chunk = _make_chunk(timestamps[valid], lats[valid], lons[valid],
+                                to_float(idx_alt)[0][valid], to_float(idx_speed)[0][valid],
+                                to_float(idx_acc)[0][valid])
+            # 取前几个无效行作为示例（缺失的字段读成了空串）
+            bad_samples = [_bad_row_sample(list(row), indices)
+                           for row in df[~valid].head(MAX_BAD_SAMPLES).itertuples(index=False)]
+            yield chunk, len(df) - len(chunk), bad_samples
+
+def _parse_block_numba(mm, buf, start, end, indices):
+    """
+    用 numba 编译的解析器解析 mm[start:end] 中的完整CSV行，返回 (RECORD_DTYPE 数组, 无效行数, 无效行示例)
+    
+    buf 是 mm 的 uint8 视图，解析直接在映射的内存上进行
+    """
+    if mm.find(b'"', start, end) >= 0:
+        # 含引号的字段交给 csv 模块切分
+        return _parse_rows(list(csv.reader(mm[start:end].decode('utf-8').splitlines())), indices)
+    
+    idx_t, idx_lat, idx_lon, idx_alt, idx_speed, idx_acc = indices
+    timestamps, lats, lons, alts, speeds, accs, status, bounds = _parse_csv_bytes(
+        buf[:end], start, *indices)
+    
+    # 快速路径无法精确解析的行用 float()/int() 重新解析
+    for k in np.flatnonzero(status == PARSE_SLOW):
+        row = mm[bounds[k, 0]:bounds[k, 1]].decode('utf-8').split(',')
+        try:
+            timestamps[k] = _parse_timestamp(row[idx_t])
+            lats[k] = float(row[idx_lat])
+            lons[k] = float(row[idx_lon])
+            alts[k] = _parse_optional(row[idx_alt]) if 0 <= idx_alt < len(row) else float('nan')
+            speeds[k] = _parse_optional(row[idx_speed]) if 0 <= idx_speed < len(row) else float('nan')
+            accs[k] = _parse_optional(row[idx_acc]) if 0 <= idx_acc < len(row) else float('nan')
+            status[k] = PARSE_OK
+        except (ValueError, IndexError, OverflowError):
+            status[k] = PARSE_INVALID
+    
+    # 跳过时间或经纬度无效、时间戳超出范围的行，只解码前几个作为示例
+    valid = (status == PARSE_OK) & (timestamps >= MIN_TIMESTAMP) & (timestamps <= MAX_TIMESTAMP)
+    chunk = _make_chunk(timestamps[valid], lats[valid], lons[valid],
+                        alts[valid], speeds[valid], accs[valid])
+    bad_samples = [_bad_row_sample(mm[bounds[k, 0]:bounds[k, 1]].decode('utf-8', 'replace').split(','), indices)
+                   for k in np.flatnonzero(~valid)[:MAX_BAD_SAMPLES]]
+    return chunk, len(status) - len(chunk), bad_samples
+
+def iter_chunks_numba(csv_file, indices):
+    """
+    把文件只读映射到内存（mmap），每约 CHUNK_BYTES 在行边界切一块，逐块生成 (RECORD_DTYPE 数组, 无效行数, 无效行示例)
+    
+    解析器直接读取映射的页面，文件内容不经过额外的读缓冲和复制
+    """
+    with open(csv_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # 映射不显式关闭：numpy 视图释放后由垃圾回收关闭
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    size = len(mm)
+    pos = mm.find(b'\n') + 1  # 跳过表头
+    while 0 < pos < size:
+        # 块的结尾延伸到下一个换行符，不切断行
+        cut = mm.find(b'\n', pos + CHUNK_BYTES) + 1 if pos + CHUNK_BYTES < size else 0
+        end = cut if cut > 0 else size
+        yield _parse_block_numba(mm, buf, pos, end, indices)
+        pos = end
+
+def _iter_batches(chunk):
+    """把内存中的一块切成每批最多 BATCH_ROWS 行"""
+    for start in range(0, len(chunk), BATCH_ROWS):
+        yield chunk[start:start + BATCH_ROWS]
+
+def _iter_run(path):
+    """分批读回一个已排序的临时块文件"""
+    with open(path, 'rb') as f:
+        while True:
+            batch = np.fromfile(f, dtype=RECORD_DTYPE, count=BATCH_ROWS)
+            if not len(batch):
+                break
+            yield batch
+
+def _merge_runs(paths, last, overlapping):
+    """多路归并写到磁盘的各块和内存中的最后一块，分批生成"""
+    runs = [_iter_run(path) for path in paths] + [_iter_batches(last)]
+    if overlapping:
+        # heapq.merge 在时间相同时按块的先后输出，与整体稳定排序的结果一致
+        merged = heapq.merge(*(chain.from_iterable(batch.tolist() for batch in run) for run in runs),
+                             key=itemgetter(0))
+        while True:
+            group = list(islice(merged, BATCH_ROWS))
+            if not group:
+                break
+            yield np.array(group, dtype=RECORD_DTYPE)
+    else:
+        # 各块时间区间首尾相接，直接按顺序拼接
+        yield from chain.from_iterable(runs)
+
+def load_records(csv_file):
+    """
+    分块读取CSV，每块按时间稳定排序；只有一块时直接在内存中返回，
+    多块时把先读到的块写到临时文件，再做多路归并，峰值内存与块大小成正比
+    
+    按已安装的依赖选择最快的解析方式：numba > pandas > 标准库 csv
+    
+    Returns:
+        (batches, indices, tmp_dir)：batches 按时间顺序分批生成 RECORD_DTYPE 数组，每批最多 BATCH_ROWS 行，
+        缺失的可选值为 nan；indices 是各列的下标，可选列不存在时为 -1；
+        tmp_dir 是存放已排序块的临时目录（只有一块时为 None），由调用方在用完 batches 后删除。
+        缺少必要的列时返回 None
+    """
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        header = next(csv.reader(f), [])
+    indices = _column_indices(header)
+    if indices is None:
+        return None
+    
+    if HAS_NUMBA:
+        chunks = iter_chunks_numba(csv_file, indices)
+    elif HAS_PANDAS:
+        chunks = iter_chunks_pandas(csv_file, indices)
+    else:
+        chunks = iter_chunks_csv(csv_file, indices)
+    
+    tmp_dir = None
+    paths = []
+    last = None
+    overlapping = False
+    total = skipped = 0
+    bad_samples = []
     try:
-        # 假设时间戳是秒级别的
-        dt = datetime.datetime.fromtimestamp(int(timestamp), tz=datetime.timezone.utc)
-        return dt.isoformat()
-    except:
-        # 如果是毫秒级别的时间戳，除以1000
-        dt = datetime.datetime.fromtimestamp(int(timestamp)/1000, tz=datetime.timezone.utc)
-        return dt.isoformat()
+        for chunk, n_skipped, samples in chunks:
+            skipped += n_skipped
+            bad_samples.extend(samples[:MAX_BAD_SAMPLES - len(bad_samples)])
+            if not len(chunk):
+                continue
+            total += len(chunk)
+            
+            # 按时间戳稳定排序（np.argsort 对整数使用基数排序）；GPS记录通常已按时间先后排列，没有逆序时跳过
+            timestamps = chunk['timestamp']
+            if (timestamps[1:] < timestamps[:-1]).any():
+                chunk = chunk[np.argsort(timestamps, kind='stable')]
+            
+            # 上一块已排好序，写到临时文件后释放
+            if last is not None:
+                if chunk['timestamp'][0] < last['timestamp'][-1]:
+                    overlapping = True
+                if tmp_dir is None:
+                    tmp_dir = tempfile.mkdtemp(prefix='csv2gpx_')
+                path = os.path.join(tmp_dir, f'run{len(paths)}.bin')
+                last.tofile(path)
+                paths.append(path)
+            last = chunk
+    except BaseException:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    
+    if skipped:
+        print(f"跳过 {skipped} 个无效行")
+        for row, e in bad_samples:
+            print(f"  无效行示例: {row} - 错误: {e}")
+    print(f"读取到 {total} 个有效GPS点")
+    print("正在按时间排序...")
+    
+    if last is None:
+        return [], indices, None
+    if not paths:
+        return _iter_batches(last), indices, None
+    return _merge_runs(paths, last, overlapping), indices, tmp_dir
 
-def create_gpx_from_csv(csv_file, output_file=None):
+def create_gpx_from_csv(csv_file, output_file=None, pretty=False):
     """
     将CSV文件转换为GPX格式
     
     Args:
         csv_file: 输入的CSV文件路径
         output_file: 输出的GPX文件路径，如果为None则自动生成
+        pretty: 是否输出带换行和缩进的GPX，默认输出紧凑格式（文件更小、写得更快）
     """
     
     if output_file is None:
         output_file = os.path.splitext(csv_file)[0] + '.gpx'
     
-    # 创建GPX根元素
-    gpx = Element('gpx')
-    gpx.set('version', '1.1')
-    gpx.set('creator', 'CSV to GPX Converter')
-    gpx.set('xmlns', 'http://www.topografix.com/GPX/1/1')
-    gpx.set('xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
-    gpx.set('xsi:schemaLocation', 'http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd')
-    
-    # 添加metadata
-    metadata = SubElement(gpx, 'metadata')
-    name = SubElement(metadata, 'name')
-    name.text = 'Track from CSV'
-    time = SubElement(metadata, 'time')
-    time.text = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    
-    # 创建track
-    trk = SubElement(gpx, 'trk')
-    trk_name = SubElement(trk, 'name')
-    trk_name.text = 'GPS Track'
-    
-    # 创建track segment
-    trkseg = SubElement(trk, 'trkseg')
-    
     # 读取CSV文件
     try:
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            
-            # 检查是否有必要的列
-            required_columns = ['dataTime', 'longitude', 'latitude']
-            if not all(col in reader.fieldnames for col in required_columns):
-                print(f"警告: CSV文件缺少必要的列。需要: {required_columns}")
-                print(f"实际列: {reader.fieldnames}")
-                return False
+        loaded = load_records(csv_file)
+        if loaded is None:
+            return False
+        batches, indices, tmp_dir = loaded
             
-            # 先读取所有数据到列表中
-            all_rows = []
-            for row in reader:
-                try:
-                    # 验证基本数据
-                    timestamp = row['dataTime']
-                    longitude = float(row['longitude'])
-                    latitude = float(row['latitude'])
-                    
-                    # 添加到列表中
-                    all_rows.append(row)
-                    
-                except (ValueError, KeyError) as e:
-                    print(f"跳过无效行: {row} - 错误: {e}")
-                    continue
+    except FileNotFoundError:
+        print(f"错误: 找不到文件 {csv_file}")
+        return False
+    except Exception as e:
+        print(f"读取CSV文件时发生错误: {e}")
+        return False
+    
+    print("排序完成，开始生成GPX轨迹...")
+    
+    # 边生成边写入：每个轨迹点直接写到文件，不在内存中构建整棵树
+    try:
+        with open(output_file, 'w', encoding='utf-8') as out:
+            gen = XMLGenerator(out, 'utf-8')
+            indent = INDENT if pretty else NO_INDENT
+            gen.startDocument()
             
-            # 按时间戳排序
-            print(f"读取到 {len(all_rows)} 个有效GPS点")
-            print("正在按时间排序...")
+            # GPX根元素
+            gen.startElement('gpx', {
+                'version': '1.1',
+                'creator': 'CSV to GPX Converter',
+                'xmlns': 'http://www.topografix.com/GPX/1/1',
+                'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+                'xsi:schemaLocation': 'http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd',
+            })
             
-            all_rows.sort(key=lambda x: int(x['dataTime']))
+            # 添加metadata
+            gen.ignorableWhitespace(indent[1])
+            gen.startElement('metadata', NO_ATTRS)
+            _write_text_element(gen, indent[2], 'name', 'Track from CSV')
+            _write_text_element(gen, indent[2], 'time', datetime.datetime.now(datetime.timezone.utc).isoformat())
+            gen.ignorableWhitespace(indent[1])
+            gen.endElement('metadata')
             
-            print("排序完成，开始生成GPX轨迹...")
+            # 创建track和track segment
+            gen.ignorableWhitespace(indent[1])
+            gen.startElement('trk', NO_ATTRS)
+            _write_text_element(gen, indent[2], 'name', 'GPS Track')
+            gen.ignorableWhitespace(indent[2])
+            gen.startElement('trkseg', NO_ATTRS)
             
+            # 轨迹点的内容只有数字和ISO时间，不含需要转义的字符，直接写入文件，绕过 XMLGenerator 的转义
+            write = out.write
+            i3, i4, i5 = indent[3], indent[4], indent[5]
+            # CSV中没有的列整列为 nan，循环内直接跳过对应的判断
+            has_alt, has_speed, has_acc = (idx >= 0 for idx in indices[3:])
             point_count = 0
-            for row in all_rows:
-                try:
-                    # 获取基本位置信息
-                    timestamp = row['dataTime']
-                    longitude = float(row['longitude'])
-                    latitude = float(row['latitude'])
-                    
-                    # 创建track point
-                    trkpt = SubElement(trkseg, 'trkpt')
-                    trkpt.set('lat', str(latitude))
-                    trkpt.set('lon', str(longitude))
-                    
-                    # 添加时间
-                    if timestamp:
-                        time_elem = SubElement(trkpt, 'time')
-                        time_elem.text = timestamp_to_iso(timestamp)
+            for batch in batches:
+                # 时间和经纬度按批在C层格式化好，循环中只拼接字符串
+                for time_str, latitude, longitude, altitude, speed, accuracy in zip(
+                        format_times(batch['timestamp']),
+                        format_column(batch['latitude'], '%.7f'), format_column(batch['longitude'], '%.7f'),
+                        batch['altitude'].tolist(), batch['speed'].tolist(), batch['accuracy'].tolist()):
+                    # 写出track point
+                    write(f'{i3}<trkpt lat="{latitude}" lon="{longitude}">'
+                          f'{i4}<time>{time_str}+00:00</time>')
                     
                     # 添加海拔信息（如果有）
-                    if 'altitude' in row and row['altitude']:
-                        try:
-                            altitude = float(row['altitude'])
-                            ele = SubElement(trkpt, 'ele')
-                            ele.text = str(altitude)
-                        except ValueError:
-                            pass
+                    if has_alt and not isnan(altitude):
+                        write(f'{i4}<ele>{altitude:.2f}</ele>')
                     
-                    # 添加速度信息（如果有）
-                    if 'speed' in row and row['speed']:
-                        try:
-                            speed = float(row['speed'])
-                            if speed > 0:
-                                extensions = SubElement(trkpt, 'extensions')
-                                speed_elem = SubElement(extensions, 'speed')
-                                speed_elem.text = str(speed)
-                        except ValueError:
-                            pass
-                    
-                    # 添加精度信息（如果有）
-                    if 'accuracy' in row and row['accuracy']:
-                        try:
-                            accuracy = float(row['accuracy'])
-                            if accuracy > 0:
-                                if trkpt.find('extensions') is None:
-                                    extensions = SubElement(trkpt, 'extensions')
-                                else:
-                                    extensions = trkpt.find('extensions')
-                                hdop = SubElement(extensions, 'hdop')
-                                hdop.text = str(accuracy)
-                        except ValueError:
-                            pass
+                    # 添加速度和精度信息（如果有，nan 与 0 比较为 False），extensions 在第一次用到时才打开
+                    ext_open = False
+                    if has_speed and speed > 0:
+                        write(f'{i4}<extensions>{i5}<speed>{speed:.2f}</speed>')
+                        ext_open = True
+                    if has_acc and accuracy > 0:
+                        if not ext_open:
+                            write(f'{i4}<extensions>')
+                            ext_open = True
+                        write(f'{i5}<hdop>{accuracy:.2f}</hdop>')
+                    if ext_open:
+                        write(f'{i4}</extensions>')
+                    write(f'{i3}</trkpt>')
                     
                     point_count += 1
-                    
-                except (ValueError, KeyError) as e:
-                    print(f"处理排序后数据时出错: {row} - 错误: {e}")
-                    continue
             
-            print(f"成功处理了 {point_count} 个GPS点")
-            
-    except FileNotFoundError:
-        print(f"错误: 找不到文件 {csv_file}")
-        return False
-    except Exception as e:
-        print(f"读取CSV文件时发生错误: {e}")
-        return False
-    
-    # 格式化XML并写入文件
-    try:
-        rough_string = tostring(gpx, 'utf-8')
-        reparsed = minidom.parseString(rough_string)
-        pretty_xml = reparsed.toprettyxml(indent="  ")
-        
-        # 移除多余的空行
-        pretty_xml = '\n'.join([line for line in pretty_xml.split('\n') if line.strip()])
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(pretty_xml)
+            gen.ignorableWhitespace(indent[2])
+            gen.endElement('trkseg')
+            gen.ignorableWhitespace(indent[1])
+            gen.endElement('trk')
+            gen.ignorableWhitespace(indent[0])
+            gen.endElement('gpx')
+            gen.ignorableWhitespace(indent[0])
+            gen.endDocument()
         
+        print(f"成功处理了 {point_count} 个GPS点")
         print(f"GPX文件已成功生成: {output_file}")
         return True
         
     except Exception as e:
         print(f"写入GPX文件时发生错误: {e}")
         return False
+    finally:
+        # 临时目录在这里删除：写出失败时 batches 可能还没开始迭代，生成器里的清理不会执行
+        if tmp_dir is not None:
+            batches.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
 def main():
     # 固定的输入文件路径